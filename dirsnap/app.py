@@ -9,11 +9,15 @@ from pathlib import Path
 import sys
 import os
 import re # Import re for scaffold exclusion logic
+import traceback
 import subprocess
 import threading
 import queue
 import fnmatch
 import ctypes
+from bisect import bisect_right
+from collections import OrderedDict, deque
+from functools import lru_cache
 
 # --- Consolidated Import Logic for logic and utils ---
 try:
@@ -79,6 +83,12 @@ except ImportError:
 
 # --- Application Constants ---
 APP_VERSION = "3.2.1" # Incremented version
+# Matches the run of whole tree prefix tokens (pipes, branches, blank columns) and spaces at the start of a snapshot line
+TREE_PREFIX_STRIP_RE = re.compile("(?:" + "|".join(re.escape(p) for p in (TREE_PIPE, TREE_SPACE, TREE_BRANCH, TREE_LAST_BRANCH)) + "| )*")
+# Characters not allowed in file names (on Windows); each is replaced with '_' in suggested file names
+FILENAME_SANITIZE_TABLE = str.maketrans({c: '_' for c in '<>:"/\\|?*'})
+# Matches one known emoji (plus one optional space) at the start of a name; longest emojis tried first
+EMOJI_STRIP_RE = re.compile("(?:" + "|".join(re.escape(e) for e in sorted(ALL_KNOWN_EMOJIS_FOR_STRIPPING, key=len, reverse=True)) + ") ?")
 
 # --- Helper function to find resources (like icons) ---
 def resource_path(relative_path):
@@ -95,6 +105,22 @@ def resource_path(relative_path):
 
     return os.path.join(base_path, relative_path)
 
+# --- Helper for map line content ranges ---
+@lru_cache(maxsize=4096)
+def _content_range_indices(line_start, text):
+    """ Returns Tk (start, end) indices of the non-whitespace content of a line, or (None, None) if blank.
+    Pure function of its arguments, so edits to the map never need to invalidate the cache. """
+    strip = text.strip()
+    if not strip: return None, None
+    lead = len(text) - len(text.lstrip()); length = len(strip)
+    start_idx = f"{line_start} + {lead} chars"; end_idx = f"{start_idx} + {length} chars"
+    return start_idx, end_idx
+
+def _index_key(tk_index):
+    """ Converts a Tk 'line.column' index (str or Tcl object) to a (line, column) tuple that sorts in text order. """
+    line, col = str(tk_index).split('.')
+    return int(line), int(col)
+
 # --- Tooltip Helper Class ---
 class Tooltip:
     """
@@ -148,6 +174,11 @@ class DirSnapApp(tk.Tk):
     QUEUE_MSG_RESULT = "result"
     TAB_SNAPSHOT = "snapshot"
     TAB_SCAFFOLD = "scaffold"
+    PARSED_MAP_CACHE_SIZE = 1 # (map_text, format) parse results kept; one covers repeated Create presses without pinning old maps
+    QUEUE_POLL_BUSY_MS = 50 # Queue poll interval while a worker is posting messages
+    QUEUE_POLL_IDLE_MS = 100 # Queue poll interval when the last poll found nothing (the old fixed interval, so results are never later)
+    MAP_LOAD_CHUNK_CHARS = 1 << 20 # Characters read and inserted per step when loading a map file
+    DESCENDANT_READ_BLOCK_LINES = 256 # Lines fetched per widget.get when collecting a clicked line's descendants
     # --- End Constants ---
 
     def __init__(self, initial_path=None, initial_mode='snapshot'):
@@ -176,6 +207,7 @@ class DirSnapApp(tk.Tk):
         self.snapshot_queue = queue.Queue()
         self.scaffold_thread = None
         self.snapshot_thread = None
+        self._parsed_map_cache = OrderedDict() # (map_text, fmt_hint) -> (parsed, line_map), LRU order
         self.initial_path = Path(initial_path) if initial_path else None
         self.initial_mode = initial_mode
 
@@ -497,19 +529,30 @@ class DirSnapApp(tk.Tk):
 
     def _copy_snapshot_to_clipboard(self, show_status=True):
         map_widget, tag = self.snapshot_map_output, self.TAG_STRIKETHROUGH
-        full_text = map_widget.get('1.0', tk.END).strip()
         ignores = set(p.strip() for p in self.snapshot_ignore_var.get().split(',') if p.strip())
+        # Patterns without glob characters only ever match one exact name: check those with a set lookup
+        glob_ignores, literal_ignores = [], set()
+        for p in ignores:
+            if any(c in p for c in '*?['): glob_ignores.append(p)
+            else: literal_ignores.update(os.path.normcase(n) for n in (p, p.rstrip('/\\'))) # Same case rules as fnmatch
         lines_to_copy, copied = [], False
         try:
-            last = map_widget.index('end-1c'); num_lines = int(last.split('.')[0]) if last else 0
-            for i in range(1, num_lines + 1):
-                start, text = f"{i}.0", map_widget.get(f"{i}.0", f"{i}.end")
-                if not text.strip(): continue
-                c_start, _ = self._get_content_range(map_widget, start, text)
-                struck = tag in map_widget.tag_names(c_start) if c_start else False
-                if struck: continue
-                item = text.strip().rstrip('/'); ignored = False
-                for pattern in ignores:
+            # Two Tk calls in total (text and struck ranges) instead of several per line
+            full_text = map_widget.get('1.0', 'end-1c')
+            struck_ranges = map_widget.tag_ranges(tag) # Flat, ordered, non-overlapping (start, end, start, end, ...)
+            struck_spans = [(_index_key(struck_ranges[k]), _index_key(struck_ranges[k + 1])) for k in range(0, len(struck_ranges) - 1, 2)]
+            struck_starts = [span_start for span_start, _ in struck_spans]
+            for i, text in enumerate(full_text.split('\n'), start=1): # Tk separates lines on '\n' only
+                stripped = text.strip()
+                if not stripped: continue
+                # A line is struck if its content start (same position as _get_content_range's start) is tagged
+                c_start = (i, len(text) - len(text.lstrip()))
+                k = bisect_right(struck_starts, c_start) - 1
+                if k >= 0 and c_start < struck_spans[k][1]: continue
+                item = stripped.rstrip('/')
+                if os.path.normcase(item) in literal_ignores: continue
+                ignored = False
+                for pattern in glob_ignores:
                      if fnmatch.fnmatch(item, pattern) or (pattern.endswith(('/', '\\')) and fnmatch.fnmatch(item, pattern.rstrip('/\\'))): ignored = True; break
                 if ignored: continue
                 lines_to_copy.append(text)
@@ -517,7 +560,7 @@ class DirSnapApp(tk.Tk):
         final = "\n".join(lines_to_copy)
         msg, err, suc = "", False, False
         if final:
-            try: pyperclip.copy(final); copied, suc = True, True; msg = "Map copied (with exclusions)." if len(lines_to_copy) < len(full_text.splitlines()) else "Map copied."
+            try: pyperclip.copy(final); copied, suc = True, True; msg = "Map copied (with exclusions)." if len(lines_to_copy) < len(full_text.strip().splitlines()) else "Map copied."
             except Exception as e: msg, err = f"Clipboard error: {e}", True; messagebox.showerror("Clipboard Error", msg)
         else: msg, err = "Nothing valid to copy (all excluded?).", True; messagebox.showwarning("No Content", msg) if show_status else None
         if show_status: self._update_status(msg, is_error=err, is_success=suc, tab=self.TAB_SNAPSHOT)
@@ -529,7 +572,7 @@ class DirSnapApp(tk.Tk):
         except tk.TclError: messagebox.showerror("Error", "Could not get map text."); return
         if not txt_strip or txt_strip.startswith("Error:"): messagebox.showwarning("No Content", "Nothing valid to save."); return
         fname = "directory_map.txt"
-        try: root = txt_strip.splitlines()[0].strip().rstrip('/'); safe = re.sub(r'[<>:"/\\|?*]', '_', root) if root else ""; fname = f"{safe if safe else 'map'}_map.txt"
+        try: root = txt_strip.partition('\n')[0].strip().rstrip('/'); safe = root.translate(FILENAME_SANITIZE_TABLE) if root else ""; fname = f"{safe if safe else 'map'}_map.txt"
         except: pass
         path = filedialog.asksaveasfilename(initialfile=fname, defaultextension=".txt", filetypes=[("Text Files", "*.txt"), ("All", "*.*")], title="Save Map As...")
         if not path: self._update_status("Save cancelled.", tab=self.TAB_SNAPSHOT); return
@@ -550,10 +593,22 @@ class DirSnapApp(tk.Tk):
         except Exception as e: messagebox.showerror("Clipboard Error", f"Paste failed:\n{e}"); self._update_status("Paste failed.", is_error=True, tab=self.TAB_SCAFFOLD)
 
     def _load_map_from_path(self, path_obj):
+        widget = self.scaffold_map_input
+        # New text is appended after the current map, which is only removed once the whole file has loaded,
+        # so a read or decode error part-way through leaves the current map (and its tags) untouched
+        old_end = widget.index('end-1c')
         try:
-            with open(path_obj, 'r', encoding='utf-8') as f: content = f.read()
-            self.scaffold_map_input.tag_remove(self.TAG_STRIKETHROUGH, '1.0', tk.END); self.scaffold_map_input.delete('1.0', tk.END); self.scaffold_map_input.insert('1.0', content); return True
-        except Exception as e: messagebox.showerror("File Load Error", f"Load failed:\n{path_obj.name}\n\n{e}"); return False
+            with open(path_obj, 'r', encoding='utf-8') as f:
+                chunk = f.read(self.MAP_LOAD_CHUNK_CHARS)
+                while chunk: # Stream large maps into the widget instead of holding the whole file in memory
+                    widget.insert(tk.END, chunk); widget.update_idletasks()
+                    chunk = f.read(self.MAP_LOAD_CHUNK_CHARS)
+        except Exception as e:
+            try: widget.delete(old_end, tk.END) # Drop the partially loaded text
+            except tk.TclError: pass
+            messagebox.showerror("File Load Error", f"Load failed:\n{path_obj.name}\n\n{e}"); return False
+        widget.delete('1.0', old_end); widget.tag_remove(self.TAG_STRIKETHROUGH, '1.0', tk.END)
+        return True
 
     def _load_map_file(self):
         path = filedialog.askopenfilename(filetypes=[("Text", "*.txt"), ("Map", "*.map"), ("All", "*.*")], title="Load Map File")
@@ -574,11 +629,7 @@ class DirSnapApp(tk.Tk):
     def _get_content_range(self, widget, line_start, line_text=None):
         try:
             text = line_text if line_text is not None else widget.get(line_start, f"{line_start} lineend")
-            strip = text.strip();
-            if not strip: return None, None
-            lead = len(text) - len(text.lstrip()); length = len(strip)
-            start_idx = f"{line_start} + {lead} chars"; end_idx = f"{start_idx} + {length} chars"
-            return start_idx, end_idx
+            return _content_range_indices(line_start, text)
         except tk.TclError: return None, None
 
     def _toggle_tag_on_range(self, widget, tag, add, start, end):
@@ -587,17 +638,19 @@ class DirSnapApp(tk.Tk):
         except tk.TclError as e: print(f"ERROR tag toggle: {e}")
 
     def _get_descendant_lines(self, widget, start_num, start_indent):
-        desc, num = [], start_num + 1
+        """Returns (num, start_index, text) for the non-blank lines indented deeper than the start line."""
+        desc = []
+        block_lines = self.DESCENDANT_READ_BLOCK_LINES
+        num = start_num + 1
         while True:
-            idx = f"{num}.0";
-            if not widget.compare(idx, "<", "end-1c"): break
-            text = widget.get(idx, f"{num}.end"); strip = text.strip()
-            if not strip: num += 1; continue
-            indent = len(text) - len(text.lstrip())
-            if indent > start_indent: desc.append((num, idx))
-            else: break
-            num += 1
-        return desc
+            # Lines are fetched in bounded blocks, so a leaf click never copies the rest of a large map
+            lines = widget.get(f"{num}.0", f"{num + block_lines}.0").split('\n')
+            for text in lines[:block_lines]:
+                if text.strip():
+                    if len(text) - len(text.lstrip()) <= start_indent: return desc
+                    desc.append((num, f"{num}.0", text))
+                num += 1
+            if len(lines) <= block_lines: return desc # Fewer lines than asked for: reached the end of the widget
 
     def _update_ignore_csv(self, item, add):
         if not item: return False
@@ -611,14 +664,6 @@ class DirSnapApp(tk.Tk):
         if changed: var.set(", ".join(sorted(list(items))))
         return changed
 
-    def _is_directory_heuristic(self, widget, info):
-        if info["stripped"].endswith('/'): return True
-        next_num, next_start = info["num"] + 1, f"{info['num'] + 1}.0"
-        if widget.compare(next_start, "<", "end-1c"):
-            next_text = widget.get(next_start, f"{next_num}.end")
-            if next_text.strip(): return (len(next_text) - len(next_text.lstrip())) > info["indent"]
-        return False
-
     # --- UPDATED CLICK HANDLERS ---
     def _handle_snapshot_map_click(self, event):
         """Handles clicks on the snapshot map. Improved stripping & cascade."""
@@ -633,30 +678,17 @@ class DirSnapApp(tk.Tk):
 
             apply_tag = tag not in widget.tag_names(c_start)
             descendants = self._get_descendant_lines(widget, info["num"], info["indent"])
-            cascade = self._is_directory_heuristic(widget, info) or bool(descendants)
+            cascade = info["stripped"].endswith('/') or bool(descendants) # A more-indented next line is already a descendant
             lines = [(info["num"], info["start"], info["text"])]
-            if cascade: lines.extend([(d_num, d_start, widget.get(d_start, f"{d_num}.end")) for d_num, d_start in descendants if widget.get(d_start, f"{d_num}.end").strip()])
+            if cascade: lines.extend(descendants)
 
             changed = False
             for num, start, text in lines:
                 if not text.strip(): continue
                 # --- Improved Clean Name Extraction ---
-                name = text.lstrip()
-                loops, max_loops = 0, 20
-                while loops < max_loops:
-                    start_len = len(name)
-                    if name.startswith(TREE_PIPE): name = name[len(TREE_PIPE):]
-                    elif name.startswith(TREE_SPACE): name = name[len(TREE_SPACE):]
-                    elif name.startswith(TREE_BRANCH): name = name[len(TREE_BRANCH):]
-                    elif name.startswith(TREE_LAST_BRANCH): name = name[len(TREE_LAST_BRANCH):]
-                    name = name.lstrip(' ') # Strip extra space
-                    if len(name) == start_len: break
-                    loops += 1
-                for emoji in ALL_KNOWN_EMOJIS_FOR_STRIPPING:
-                    if name.startswith(emoji):
-                        name = name[len(emoji):]
-                        if name.startswith(' '): name = name[1:]
-                        break
+                name = text.lstrip(); name = name[TREE_PREFIX_STRIP_RE.match(name).end():]
+                emoji_match = EMOJI_STRIP_RE.match(name)
+                if emoji_match: name = name[emoji_match.end():]
                 clean_name = name.rstrip('/').strip()
                 # --- End Extraction ---
 
@@ -671,7 +703,7 @@ class DirSnapApp(tk.Tk):
                 self._update_status(f"{action} item(s) to custom ignores.", tab=self.TAB_SNAPSHOT)
                 if self.snapshot_auto_copy_var.get(): self._copy_snapshot_to_clipboard(show_status=False)
 
-        except Exception as e: print(f"ERROR snapshot click: {e}"); import traceback; traceback.print_exc()
+        except Exception as e: print(f"ERROR snapshot click: {e}"); traceback.print_exc()
 
     def _handle_scaffold_map_click(self, event):
         """Handles clicks on the scaffold map input area."""
@@ -687,12 +719,12 @@ class DirSnapApp(tk.Tk):
             apply_tag = tag not in widget.tag_names(c_start)
             descendants = self._get_descendant_lines(widget, info["num"], info["indent"])
             lines = [(info["num"], info["start"], info["text"])]
-            lines.extend([(d_num, d_start, widget.get(d_start, f"{d_num}.end")) for d_num, d_start in descendants if widget.get(d_start, f"{d_num}.end").strip()])
+            lines.extend(descendants)
 
             for num, start, text in lines:
                 cs, ce = self._get_content_range(widget, start, text)
                 self._toggle_tag_on_range(widget, tag, apply_tag, cs, ce)
-        except Exception as e: print(f"ERROR scaffold click: {e}"); import traceback; traceback.print_exc()
+        except Exception as e: print(f"ERROR scaffold click: {e}"); traceback.print_exc()
 
     # --- Threading / Queue Helpers ---
     def _start_background_task(self, target_func, args, queue_obj, button, progressbar, status_msg, tab, progress_mode, check_func):
@@ -707,7 +739,7 @@ class DirSnapApp(tk.Tk):
         thread_attr = "snapshot_thread" if tab == self.TAB_SNAPSHOT else "scaffold_thread"
         thread = threading.Thread(target=target_func, args=args + (queue_obj,), daemon=True)
         setattr(self, thread_attr, thread); thread.start()
-        if check_func: self.after(100, check_func)
+        if check_func: self.after(self.QUEUE_POLL_BUSY_MS, check_func)
         else: print(f"Warn: No queue check func for {tab}."); self._finalize_task_ui(button, progressbar) # Reset if no check
 
     def _finalize_task_ui(self, button, progressbar):
@@ -716,6 +748,21 @@ class DirSnapApp(tk.Tk):
             if button and button.winfo_exists(): button.config(state=tk.NORMAL)
         except tk.TclError: print("Warn: Finalize UI error (widget destroyed?).")
 
+    def _get_parsed_map(self, map_text, fmt_hint):
+        """Returns (parsed, line_map) for the map text, reusing the cached result if text and format are unchanged."""
+        key = (map_text, fmt_hint)
+        cached = self._parsed_map_cache.get(key)
+        if cached is not None: self._parsed_map_cache.move_to_end(key); return cached
+        parsed = logic.parse_map(map_text, fmt_hint, excluded_lines=set())
+        line_map = {} # 1-based line number -> index into parsed
+        if parsed:
+            # Parsed items line up with the non-empty, non-comment lines; zip stops once parsed is exhausted
+            content_lines = (ln for ln, line in enumerate(map_text.splitlines(), start=1) if line.strip() and not line.lstrip().startswith('#'))
+            line_map = dict(zip(content_lines, range(len(parsed))))
+        self._parsed_map_cache[key] = (parsed, line_map)
+        if len(self._parsed_map_cache) > self.PARSED_MAP_CACHE_SIZE: self._parsed_map_cache.popitem(last=False)
+        return parsed, line_map
+
     # --- UPDATED Trigger Methods ---
     def _generate_snapshot(self):
         src = self.snapshot_dir_var.get()
@@ -730,15 +777,16 @@ class DirSnapApp(tk.Tk):
     def _create_structure(self):
         """Handles 'Create Structure'. Expands exclusions before calling backend."""
         map_widget, tag = self.scaffold_map_input, self.TAG_STRIKETHROUGH
-        map_text, base_dir, fmt_hint = map_widget.get('1.0', tk.END).strip(), self.scaffold_base_dir_var.get(), self.scaffold_format_var.get()
+        raw_text = map_widget.get('1.0', 'end-1c') # Widget lines, read once for both parsing and tag checks
+        map_text, base_dir, fmt_hint = raw_text.strip(), self.scaffold_base_dir_var.get(), self.scaffold_format_var.get()
         if not map_text: messagebox.showwarning("Input Required", "Map input empty."); return
         if not base_dir or not Path(base_dir).is_dir(): messagebox.showwarning("Input Required", "Select valid base directory."); return
 
         initial_excludes = set()
         try: # Get initially excluded lines from UI tags
-            last = map_widget.index('end-1c'); num_lines = int(last.split('.')[0]) if last else 0
-            for i in range(1, num_lines + 1):
-                start = f"{i}.0"; c_start, _ = self._get_content_range(map_widget, start)
+            widget_lines = raw_text.split('\n') # Tk separates lines on '\n' only; one entry per widget line
+            for i, line_text in enumerate(widget_lines, start=1):
+                start = f"{i}.0"; c_start, _ = self._get_content_range(map_widget, start, line_text)
                 if c_start and tag in map_widget.tag_names(c_start): initial_excludes.add(i)
         except tk.TclError as e: print(f"ERROR reading tags: {e}"); messagebox.showerror("Error", f"Exclusion error:\n{e}"); return
 
@@ -747,17 +795,14 @@ class DirSnapApp(tk.Tk):
         try:
             # Use logic module to parse (can fail if logic not imported)
             if logic:
-                 parsed = logic.parse_map(map_text, fmt_hint, excluded_lines=set())
+                 parsed, line_map = self._get_parsed_map(map_text, fmt_hint)
                  if parsed:
-                      line_map = {}; idx = 0; lines = map_text.splitlines()
-                      for i, line in enumerate(lines):
-                           ln = i + 1
-                           if line.strip() and not line.strip().startswith('#'):
-                                if idx < len(parsed): line_map[ln] = idx; idx += 1
-                      parents_to_check = list(initial_excludes); processed = set()
+                      lines = map_text.splitlines()
+                      parents_to_check = deque(initial_excludes); processed = set()
                       while parents_to_check:
-                           p_ln = parents_to_check.pop(0)
-                           if p_ln in processed: continue; processed.add(p_ln)
+                           p_ln = parents_to_check.popleft()
+                           if p_ln in processed: continue
+                           processed.add(p_ln)
                            p_idx = line_map.get(p_ln)
                            if p_idx is not None:
                                 p_lvl, _, p_is_dir = parsed[p_idx]
@@ -775,7 +820,7 @@ class DirSnapApp(tk.Tk):
                                           c_ln += 1
                  else: print("Warn: Map pre-parsing failed for exclusion expansion.")
             else: print("Warn: Logic module not available for exclusion expansion.")
-        except Exception as e: print(f"ERROR expanding excludes: {e}"); import traceback; traceback.print_exc(); final_excludes = set(initial_excludes)
+        except Exception as e: print(f"ERROR expanding excludes: {e}"); traceback.print_exc(); final_excludes = set(initial_excludes)
         # --- End Expand Exclusions ---
 
         self.scaffold_open_folder_button.grid_remove(); self.last_scaffold_path = None
@@ -795,10 +840,12 @@ class DirSnapApp(tk.Tk):
     def _scaffold_thread_target(self, map_txt, base, hint, excludes, q):
         root = None
         try: msg, suc, root = logic.create_structure_from_map(map_txt, base, hint, excludes, q); q.put({'type': self.QUEUE_MSG_RESULT, 'success': suc, 'message': msg, 'root_name': root})
-        except Exception as e: q.put({'type': self.QUEUE_MSG_RESULT, 'success': False, 'message': f"Thread Error: {e}", 'root_name': None}); print(f"Scaf thread ERR: {e}"); import traceback; traceback.print_exc()
+        except Exception as e: q.put({'type': self.QUEUE_MSG_RESULT, 'success': False, 'message': f"Thread Error: {e}", 'root_name': None}); print(f"Scaf thread ERR: {e}"); traceback.print_exc()
 
     # --- Queue Checking Functions ---
-    def _check_snapshot_queue(self):
+    def _check_snapshot_queue(self, delay=None):
+        # Snapshots post a single result, so back off from the busy to the idle interval while waiting
+        delay = self.QUEUE_POLL_BUSY_MS if delay is None else delay
         try:
             while True:
                 msg = self.snapshot_queue.get_nowait(); mtype = msg.get('type')
@@ -814,31 +861,38 @@ class DirSnapApp(tk.Tk):
                     return
         except queue.Empty:
             thread = getattr(self, 'snapshot_thread', None)
-            if thread and thread.is_alive(): self.after(100, self._check_snapshot_queue)
+            if thread and thread.is_alive(): self.after(delay, self._check_snapshot_queue, min(delay * 2, self.QUEUE_POLL_IDLE_MS))
             else: self._finalize_task_ui(self.snapshot_regenerate_button, self.snapshot_progress_bar) # Finalize if thread done/missing
-        except Exception as e: print(f"ERROR check snap Q: {e}"); import traceback; traceback.print_exc(); self._finalize_task_ui(self.snapshot_regenerate_button, self.snapshot_progress_bar)
+        except Exception as e: print(f"ERROR check snap Q: {e}"); traceback.print_exc(); self._finalize_task_ui(self.snapshot_regenerate_button, self.snapshot_progress_bar)
+
+    def _apply_scaffold_progress(self, msg):
+        curr, tot = msg.get('current', 0), msg.get('total', 1)
+        try: # Update progress bar safely
+            pb = self.scaffold_progress_bar
+            if pb and pb.winfo_exists(): pbmax = max(1, tot); pb['maximum'] = pbmax; pb['mode'] = 'determinate'; pb['value'] = curr
+        except Exception as e: print(f"Warn: Prog bar update error: {e}")
 
     def _check_scaffold_queue(self):
+        last_progress = None # Only the newest progress message per poll is applied to the widget
+        drained = 0
         try:
             while True:
-                msg = self.scaffold_queue.get_nowait(); mtype = msg.get('type')
+                msg = self.scaffold_queue.get_nowait(); mtype = msg.get('type'); drained += 1
                 if mtype == self.QUEUE_MSG_PROGRESS:
-                    curr, tot = msg.get('current', 0), msg.get('total', 1)
-                    try: # Update progress bar safely
-                        pb = self.scaffold_progress_bar
-                        if pb and pb.winfo_exists(): pbmax = max(1, tot); pb['maximum'] = pbmax; pb['mode'] = 'determinate'; pb['value'] = curr
-                    except Exception as e: print(f"Warn: Prog bar update error: {e}")
+                    last_progress = msg
                 elif mtype == self.QUEUE_MSG_RESULT:
+                    if last_progress: self._apply_scaffold_progress(last_progress)
                     suc, txt, root = msg.get('success', False), msg.get('message', 'Unknown'), msg.get('root_name')
                     self._update_status(txt, is_error=not suc, is_success=suc, tab=self.TAB_SCAFFOLD)
                     self._finalize_task_ui(self.scaffold_create_button, self.scaffold_progress_bar)
                     if suc and root: self._show_open_folder_button(root)
                     return
         except queue.Empty:
+            if last_progress: self._apply_scaffold_progress(last_progress)
             thread = getattr(self, 'scaffold_thread', None)
-            if thread and thread.is_alive(): self.after(100, self._check_scaffold_queue)
+            if thread and thread.is_alive(): self.after(self.QUEUE_POLL_BUSY_MS if drained else self.QUEUE_POLL_IDLE_MS, self._check_scaffold_queue)
             else: self._finalize_task_ui(self.scaffold_create_button, self.scaffold_progress_bar)
-        except Exception as e: print(f"ERROR check scaf Q: {e}"); import traceback; traceback.print_exc(); self._finalize_task_ui(self.scaffold_create_button, self.scaffold_progress_bar)
+        except Exception as e: print(f"ERROR check scaf Q: {e}"); traceback.print_exc(); self._finalize_task_ui(self.scaffold_create_button, self.scaffold_progress_bar)
 
     def _show_open_folder_button(self, root_name):
          try:
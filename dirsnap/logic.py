@@ -5,8 +5,13 @@
 import os
 import fnmatch
 import re
+import traceback
+from bisect import bisect_right
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from functools import lru_cache, partial
+from math import gcd
 from pathlib import Path
-from typing import NamedTuple, Optional, Set, List, Tuple, Dict, Any # Added NamedTuple, Optional etc.
+from typing import NamedTuple, Optional, Set, List, Tuple, Dict, Any, Callable, Iterable, Iterator, TextIO # Added NamedTuple, Optional etc.
 
 # --- Default Configuration ---
 DEFAULT_IGNORE_PATTERNS = {
@@ -15,6 +20,8 @@ DEFAULT_IGNORE_PATTERNS = {
     '*~', '*.tmp', '*.bak', '*.swp',
 }
 DEFAULT_SNAPSHOT_SPACES = 2 # Used for 'Standard Indent' format
+SNAPSHOT_SCAN_WORKERS = 8 # Threads listing directories concurrently during a snapshot
+SCAFFOLD_PROGRESS_UPDATES = 100 # Roughly how many progress messages a scaffold run sends
 
 # --- Tree Format Constants ---
 TREE_BRANCH = "├── " # Includes space
@@ -62,7 +69,25 @@ FILE_TYPE_EMOJIS = {
 # --- End Expanded Emojis ---
 
 # Regex to detect tree prefixes more reliably after leading whitespace (for detection)
-TREE_PREFIX_RE = re.compile(r"^\s*([││]|├──|└──)")
+TREE_PREFIX_RE = re.compile(r"^\s*(│|├──|└──)")
+
+# Regex splitting a Tree format line into (level units)(branch prefix)?; used by the tree parser
+_TREE_LINE_PREFIX_RE = re.compile(
+    "((?:" + re.escape(TREE_PIPE) + "|" + re.escape(TREE_SPACE) + ")*)(" + re.escape(TREE_BRANCH) + "|" + re.escape(TREE_LAST_BRANCH) + ")?"
+)
+
+# Alternation of all known emojis, longest first so a multi-codepoint emoji wins over any shorter prefix of it.
+_EMOJI_ALTERNATION = "|".join(re.escape(e) for e in sorted({FOLDER_EMOJI, DEFAULT_FILE_EMOJI, *FILE_TYPE_EMOJIS.values()}, key=len, reverse=True))
+# Regex splitting a name remainder into (whitespace)(emoji)?(one space)?. The whitespace is consumed
+# greedily before the emoji is tried, the same as stripping it first.
+_EMOJI_PREFIX_RE = re.compile(r"\s*(?:(" + _EMOJI_ALTERNATION + ")( ?))?")
+
+# Regex dissecting the start of an Indent/Generic map line in one pass:
+# (leading spaces)(structure prefix)?(whitespace)(emoji)?(one space)?
+_LINE_COMPONENTS_RE = re.compile(
+    "( *)(" + "|".join(re.escape(p) for p in (TREE_BRANCH, TREE_LAST_BRANCH, "- ", "* ")) + r")?(\s*)"
+    "(?:(" + _EMOJI_ALTERNATION + ")( ?))?"
+)
 
 
 # ============================================================
@@ -82,29 +107,14 @@ def _extract_final_components(text_remainder: str, original_line_for_warning: st
     Returns:
         Tuple: (detected_emoji, clean_name, is_directory)
     """
-    # Dynamically build list of known emojis for parsing this line
-    parse_known_emojis = list(set([FOLDER_EMOJI, DEFAULT_FILE_EMOJI] + list(FILE_TYPE_EMOJIS.values())))
-
     detected_emoji = ""
     content_after_emoji = text_remainder
 
-    # Detect and Measure Emoji
-    emoji_len = 0
-    space_after_emoji_len = 0
-    # Check for potential leading space before emoji
-    stripped_remainder = text_remainder.lstrip()
-    for emoji in parse_known_emojis:
-        if stripped_remainder.startswith(emoji):
-            detected_emoji = emoji
-            emoji_len = len(emoji)
-            # Find where the emoji actually starts in the original remainder
-            emoji_start_index = text_remainder.find(emoji)
-            temp_remainder = text_remainder[emoji_start_index + emoji_len:]
-            # Check for exactly one space after the emoji
-            if temp_remainder.startswith(' '):
-                space_after_emoji_len = 1
-            content_after_emoji = temp_remainder[space_after_emoji_len:]
-            break # Found the first matching emoji
+    # Detect Emoji (allowing leading space before it, and consuming exactly one space after it)
+    emoji_match = _EMOJI_PREFIX_RE.match(text_remainder) # Always matches; group 1 is set only if an emoji follows
+    if emoji_match.group(1):
+        detected_emoji = emoji_match.group(1)
+        content_after_emoji = text_remainder[emoji_match.end():]
 
     # Final Name Extraction and Cleaning
     item_name_part = content_after_emoji
@@ -136,64 +146,26 @@ def _extract_line_components(line_text: str) -> LineComponents:
     """
     original_line = line_text
     line_rstrip = line_text.rstrip()
+    line_content = line_rstrip.lstrip()
 
     # Handle empty lines or comments
-    if not line_rstrip.strip() or line_rstrip.strip().startswith('#'):
-        return LineComponents(
-            raw_indent_width=len(line_text) - len(line_text.lstrip(' ')), # Preserve original indent if needed
-            effective_indent_width=0, prefix_chars="", emoji="", clean_name="",
-            is_directory=False, is_empty_or_comment=True
-        )
-
-    raw_indent_width = len(line_rstrip) - len(line_rstrip.lstrip(' '))
-    content_after_spaces = line_rstrip[raw_indent_width:]
-
-    current_index = raw_indent_width
-    detected_prefix = ""
-    prefix_len = 0
-
-    # Detect structure prefixes first
-    if content_after_spaces.startswith(TREE_BRANCH):
-        prefix_len = len(TREE_BRANCH); detected_prefix = TREE_BRANCH
-    elif content_after_spaces.startswith(TREE_LAST_BRANCH):
-        prefix_len = len(TREE_LAST_BRANCH); detected_prefix = TREE_LAST_BRANCH
-    elif content_after_spaces.startswith("- "):
-        prefix_len = 2; detected_prefix = "- "
-    elif content_after_spaces.startswith("* "):
-        prefix_len = 2; detected_prefix = "* "
-    # Add more prefixes here if needed
-
-    current_index += prefix_len
-    content_after_prefix = content_after_spaces[prefix_len:]
-
-    # Dynamically build list of known emojis for parsing this line
-    parse_known_emojis = list(set([FOLDER_EMOJI, DEFAULT_FILE_EMOJI] + list(FILE_TYPE_EMOJIS.values())))
-
-    # Detect emoji *after* prefix
-    content_after_emoji = content_after_prefix
-    detected_emoji = ""
-    emoji_len = 0
-    space_after_emoji_len = 0
-    stripped_after_prefix = content_after_prefix.lstrip() # Check for emoji after potential space
-    for emoji in parse_known_emojis:
-        if stripped_after_prefix.startswith(emoji):
-            detected_emoji = emoji; emoji_len = len(emoji)
-            emoji_start_index = content_after_prefix.find(emoji) # Find actual start
-            temp_remainder = content_after_prefix[emoji_start_index + emoji_len:]
-            if temp_remainder.startswith(' '): space_after_emoji_len = 1
-            content_after_emoji = temp_remainder[space_after_emoji_len:]
-            break
+    if not line_content or line_content.startswith('#'):
+        # Positional construction: this runs once per map line
+        return LineComponents(len(line_text) - len(line_text.lstrip(' ')), 0, "", "", "", False, True) # Preserve original indent if needed
 
-    # Update index based on actual emoji position and space
+    # Indent, structure prefix (├── , └── , - , * ) and emoji are all detected by a single match
+    match = _LINE_COMPONENTS_RE.match(line_rstrip)
+    raw_indent_width = match.end(1)
+    detected_prefix = match.group(2) or ""
+    detected_emoji = match.group(4) or ""
+
+    # Effective indent is just after the emoji (and its space), or after prefix and any leading spaces
     if detected_emoji:
-        current_index = raw_indent_width + content_after_prefix.find(detected_emoji) + emoji_len + space_after_emoji_len
+        effective_indent_width = match.end() - len(detected_prefix) # This might still be complex for generic use
     else:
-        # If no emoji, effective indent is just after prefix (and any leading spaces)
-        current_index = raw_indent_width + prefix_len + (len(content_after_prefix) - len(content_after_prefix.lstrip()))
-
-    effective_indent_width = current_index # This might still be complex for generic use
+        effective_indent_width = match.end(3)
 
-    item_name_part = content_after_emoji
+    item_name_part = line_rstrip[match.end():]
     is_directory = item_name_part.endswith('/')
     clean_name = item_name_part.rstrip('/').strip()
 
@@ -202,26 +174,206 @@ def _extract_line_components(line_text: str) -> LineComponents:
         pass
 
     return LineComponents(
-        raw_indent_width=raw_indent_width,
-        effective_indent_width=effective_indent_width, # Use with caution
-        prefix_chars=detected_prefix,
-        emoji=detected_emoji,
-        clean_name=clean_name,
-        is_directory=is_directory,
-        is_empty_or_comment=False
+        raw_indent_width,
+        effective_indent_width, # Use with caution
+        detected_prefix,
+        detected_emoji,
+        clean_name,
+        is_directory,
+        False # is_empty_or_comment
     )
 
 
+# --- Helpers for Snapshot Directory Scanning ---
+_GLOB_CHARS = ('*', '?', '[')
+_PATH_SEPARATORS = ('/', '\\')
+_NORMCASE_NEEDED = os.path.normcase('A/') != 'A/' # True on Windows, where fnmatch ignores case
+
+class IgnoreRules(NamedTuple):
+    """Ignore patterns sorted into fast checks, compiled once for files or for directories."""
+    literal_names: frozenset # Plain names (e.g. '.git'), checked with a set lookup
+    name_suffixes: tuple # '*' followed by plain text (e.g. '*.pyc'), checked with str.endswith
+    name_match: Optional[Callable[[str], Any]] # Union regex of glob patterns, matched against the entry name
+    path_match: Optional[Callable[[str], Any]] # Union regex of patterns containing a separator, matched against the full path
+
+def _compile_ignore_rules(patterns: Iterable[str], for_dirs: bool) -> IgnoreRules:
+    """
+    Compiles ignore patterns into IgnoreRules. Patterns ending in '/' or '\\' only
+    apply to directories. Only patterns containing a path separator are matched
+    against the full path; everything else is matched against the entry name.
+    """
+    literal_names: Set[str] = set()
+    name_suffixes: Set[str] = set()
+    name_globs: List[str] = []
+    path_patterns: List[str] = []
+    for pattern in patterns:
+        if pattern.endswith(_PATH_SEPARATORS):
+            if not for_dirs:
+                continue # Directory-only pattern
+            pattern = pattern.rstrip('/\\')
+        if not pattern:
+            continue
+        if _NORMCASE_NEEDED:
+            pattern = os.path.normcase(pattern)
+        if any(sep in pattern for sep in _PATH_SEPARATORS):
+            path_patterns.append(pattern)
+        elif pattern.startswith('*') and not any(c in pattern[1:] for c in _GLOB_CHARS):
+            name_suffixes.add(pattern[1:])
+        elif any(c in pattern for c in _GLOB_CHARS):
+            name_globs.append(pattern)
+        else:
+            literal_names.add(pattern)
+
+    def union_match(globs: List[str]) -> Optional[Callable[[str], Any]]:
+        return re.compile('|'.join(fnmatch.translate(g) for g in globs)).match if globs else None
+
+    return IgnoreRules(frozenset(literal_names), tuple(sorted(name_suffixes)), union_match(name_globs), union_match(path_patterns))
+
+def _is_ignored(name: str, full_path: str, rules: IgnoreRules) -> bool:
+    """Checks a directory entry against compiled IgnoreRules."""
+    if _NORMCASE_NEEDED:
+        name = os.path.normcase(name)
+    if name in rules.literal_names:
+        return True
+    if rules.name_suffixes and name.endswith(rules.name_suffixes):
+        return True
+    if rules.name_match is not None and rules.name_match(name):
+        return True
+    if rules.path_match is not None:
+        return rules.path_match(os.path.normcase(full_path) if _NORMCASE_NEEDED else full_path) is not None
+    return False
+
+@lru_cache(maxsize=64)
+def _get_ignore_rules(patterns: frozenset) -> Tuple[IgnoreRules, IgnoreRules]:
+    """Returns (file_rules, dir_rules) for a pattern set, compiled once and reused by later snapshots."""
+    file_rules = _compile_ignore_rules(patterns, for_dirs=False)
+    if not any(p.endswith(_PATH_SEPARATORS) for p in patterns):
+        return file_rules, file_rules # No directory-only patterns: both kinds of entry share one compilation
+    return file_rules, _compile_ignore_rules(patterns, for_dirs=True)
+
+class _SnapshotNode:
+    """An entry in the in-memory snapshot tree. Uses __slots__ to keep per-node memory low on large trees."""
+    __slots__ = ('name', 'is_dir', 'children')
+
+    def __init__(self, name: str, is_dir: bool):
+        self.name = name
+        self.is_dir = is_dir
+        self.children: Optional[List['_SnapshotNode']] = None # Set only for directories with entries
+
+def _scan_directory(dir_path: str, file_rules: IgnoreRules, dir_rules: IgnoreRules) -> Tuple[List[_SnapshotNode], List[Tuple[_SnapshotNode, str]]]:
+    """
+    Lists one directory with os.scandir in a single pass, dropping ignored entries.
+    Safe to run in worker threads (scandir releases the GIL while listing).
+
+    Returns:
+        Tuple: (children, subdirs) where children are the directory's nodes in display order
+               (directories first, each group sorted case-insensitively) and subdirs holds
+               (node, path) for the child directories to scan next (symlinks excluded).
+               Unreadable directories yield ([], []).
+    """
+    dirs: List[Tuple[str, str, str, bool]] = [] # (lower name, name, path, is_symlink)
+    files: List[Tuple[str, str]] = [] # (lower name, name)
+    try:
+        with os.scandir(dir_path) as it:
+            for entry in it:
+                name = entry.name
+                try:
+                    is_dir = entry.is_dir() # Symlinks to directories count as directories (like os.walk)...
+                except OSError:
+                    is_dir = False
+                if _is_ignored(name, entry.path, dir_rules if is_dir else file_rules):
+                    continue
+                if is_dir:
+                    dirs.append((name.lower(), name, entry.path, entry.is_symlink())) # ...but are not descended into
+                else:
+                    files.append((name.lower(), name))
+    except OSError:
+        return [], [] # Matches os.walk(onerror=None): unreadable directories are silently skipped
+    # Final display order (case-insensitive, ties broken case-sensitively), so rendering needn't re-sort
+    dirs.sort()
+    files.sort()
+    children: List[_SnapshotNode] = []
+    subdirs: List[Tuple[_SnapshotNode, str]] = []
+    for _, name, path, is_symlink in dirs:
+        node = _SnapshotNode(name, True)
+        children.append(node)
+        if not is_symlink: # Don't follow directory symlinks
+            subdirs.append((node, path))
+    children.extend(_SnapshotNode(name, False) for _, name in files)
+    return children, subdirs
+
+# Emoji + separating space for snapshot lines, built once instead of concatenated per node
+_FOLDER_EMOJI_PREFIX = FOLDER_EMOJI + " "
+_DEFAULT_FILE_EMOJI_PREFIX = DEFAULT_FILE_EMOJI + " "
+_FILE_EMOJI_PREFIXES = {ext: emoji + " " for ext, emoji in FILE_TYPE_EMOJIS.items()}
+
+def _get_emoji_prefix(name: str, is_dir: bool) -> str:
+    """Returns the snapshot emoji and trailing space for an entry: the folder emoji, or one chosen by file extension."""
+    if is_dir:
+        return _FOLDER_EMOJI_PREFIX
+    # The extension is the text after the last dot ('a.tar.gz' -> 'gz', '.gitignore' -> 'gitignore')
+    dot = name.rfind('.')
+    if dot == -1 or dot == len(name) - 1:
+        return _DEFAULT_FILE_EMOJI_PREFIX
+    return _FILE_EMOJI_PREFIXES.get(name[dot + 1:].lower(), _DEFAULT_FILE_EMOJI_PREFIX)
+
+def _iter_indent_lines(tree: _SnapshotNode, indent_unit: str, show_emojis: bool) -> Iterator[str]:
+    """Yields "Standard Indent"/"Tabs" lines: each level adds one indent_unit."""
+    indent_cache = [""] # indent_cache[level] -> indent string, extended as deeper levels appear
+    # Walk the tree depth-first with an explicit stack of (node, level) (no recursion limit on deep trees)
+    stack = [(tree, 0)]
+    while stack:
+        node, level = stack.pop()
+        if level == len(indent_cache): # Levels only ever grow one at a time
+            indent_cache.append(indent_cache[-1] + indent_unit)
+        emoji_prefix = _get_emoji_prefix(node.name, node.is_dir) if show_emojis else ""
+        # Directories (including the root) get a trailing '/'; scanned names never contain one
+        yield f"{indent_cache[level]}{emoji_prefix}{node.name}{'/' if node.is_dir else ''}"
+        if node.children: # Already in display order from the scan
+            child_level = level + 1
+            # Push in reverse so the first child is popped (and rendered) first
+            stack.extend((child, child_level) for child in reversed(node.children))
+
+def _iter_tree_lines(tree: _SnapshotNode, show_emojis: bool) -> Iterator[str]:
+    """Yields "Tree" lines: box-drawing branches, with the root at level 0 and no branch of its own."""
+    # Each stack entry is (node, lead, child_prefix): the node's full line lead and the prefix its own
+    # children continue from. The root has no lead; as the (last) top-level entry its children get a blank column.
+    stack = [(tree, "", TREE_SPACE)]
+    while stack:
+        node, lead, child_prefix = stack.pop()
+        emoji_prefix = _get_emoji_prefix(node.name, node.is_dir) if show_emojis else ""
+        yield f"{lead}{emoji_prefix}{node.name}{'/' if node.is_dir else ''}"
+
+        children = node.children # Already in display order from the scan
+        if children:
+            # Leads and child prefixes are built once per directory (middle and last shapes), not per entry.
+            # Push in reverse so the first child is popped (and rendered) first; only the last child is_last
+            stack.append((children[-1], child_prefix + TREE_LAST_BRANCH, child_prefix + TREE_SPACE))
+            if len(children) > 1:
+                mid_lead = child_prefix + TREE_BRANCH
+                mid_child_prefix = child_prefix + TREE_PIPE
+                stack.extend((child, mid_lead, mid_child_prefix) for child in reversed(children[:-1]))
+
+def _iter_snapshot_lines(tree: _SnapshotNode, output_format: str, show_emojis: bool) -> Iterator[str]:
+    """Yields the snapshot map one line at a time (no trailing newlines), root first, in display order."""
+    # Dispatch once to a renderer specialised for the format, rather than branching per node
+    if output_format == "Tree":
+        return _iter_tree_lines(tree, show_emojis)
+    indent_unit = "\t" if output_format == "Tabs" else " " * DEFAULT_SNAPSHOT_SPACES # Default: "Standard Indent"
+    return _iter_indent_lines(tree, indent_unit, show_emojis)
+
 # filename: dirsnap/logic.py
 
 # ============================================================
 # --- Snapshot Function ---
 # ============================================================
 def create_directory_snapshot(root_dir_str, custom_ignore_patterns=None, user_default_ignores=None,
-                               output_format="Standard Indent", show_emojis=False):
+                               output_format="Standard Indent", show_emojis=False, output: Optional[TextIO] = None):
     """
     Generates an indented text map of a directory structure, supporting different formats
     and expanded emojis. Includes the root directory name in the map.
+    If `output` (a writable text file object) is given, the map is written to it line by line
+    and "" is returned on success; error strings are returned either way.
     """
     root_dir = Path(root_dir_str).resolve()
     if not root_dir.is_dir():
@@ -251,134 +403,44 @@ def create_directory_snapshot(root_dir_str, custom_ignore_patterns=None, user_de
 
         if custom_patterns_set:
             ignore_set.update(custom_patterns_set)
+    file_rules, dir_rules = _get_ignore_rules(frozenset(ignore_set)) # Cached across snapshots with the same patterns
     # --- End Ignore Pattern Handling ---
 
     try:
-        # --- Build Intermediate Tree using os.walk ---
-        # Stores {'name': str, 'is_dir': bool, 'children': list, 'path': Path}
-        tree = {'name': root_dir.name, 'is_dir': True, 'children': [], 'path': root_dir}
-        node_map = {root_dir: tree} # Map Path objects to their nodes in the tree
+        # --- Build Intermediate Tree by scanning directories in parallel ---
+        tree = _SnapshotNode(root_dir.name, True)
         current_path_for_error = root_dir # For error reporting
 
-        for root, dirs, files in os.walk(str(root_dir), topdown=True, onerror=None, followlinks=False):
-            current_path = Path(root).resolve()
-            current_path_for_error = current_path
-            parent_node = node_map.get(current_path)
-
-            if parent_node is None: # Safety check
-                print(f"Warning: Parent node not found for path {current_path} during walk. Skipping children.")
-                dirs[:] = []; files[:] = []; continue
-
-            # --- Pruning Directories (Modify dirs in-place) ---
-            dirs_to_keep = []
-            for d in dirs:
-                is_ignored = False
-                dir_path_to_check = current_path / d
-                for pattern in ignore_set:
-                    if (fnmatch.fnmatch(d, pattern) or
-                        fnmatch.fnmatch(str(dir_path_to_check), pattern) or
-                        (pattern.endswith(('/', '\\')) and fnmatch.fnmatch(d, pattern.rstrip('/\\'))) or
-                        (pattern.endswith(('/', '\\')) and fnmatch.fnmatch(str(dir_path_to_check), pattern.rstrip('/\\')))):
-                        is_ignored = True
-                        break
-                if not is_ignored:
-                    dirs_to_keep.append(d)
-            dirs[:] = sorted(dirs_to_keep) # Modify dirs *in place* and sort
-
-            # --- Filtering Files ---
-            files_to_keep = []
-            for f in files:
-                 is_ignored = False
-                 file_path_to_check = current_path / f
-                 for pattern in ignore_set:
-                      if fnmatch.fnmatch(f, pattern) or fnmatch.fnmatch(str(file_path_to_check), pattern):
-                           is_ignored = True
-                           break
-                 if not is_ignored:
-                     files_to_keep.append(f)
-            files = sorted(files_to_keep) # Sort remaining files
-
-            # --- Add children nodes to the tree structure in memory ---
-            for d_name in dirs: # Already sorted
-                dir_path = current_path / d_name
-                child_node = {'name': d_name, 'is_dir': True, 'children': [], 'path': dir_path}
-                parent_node['children'].append(child_node)
-                node_map[dir_path] = child_node
-
-            for f_name in files: # Already sorted
-                 file_path = current_path / f_name
-                 child_node = {'name': f_name, 'is_dir': False, 'path': file_path}
-                 parent_node['children'].append(child_node)
+        def add_children(parent_node, scan_result):
+            """Attaches scanned children to parent_node; returns (node, path) for the directories to scan next."""
+            children, subdirs = scan_result
+            if children: # Files and empty directories keep children=None
+                parent_node.children = children
+            return subdirs
+
+        # The root is listed on this thread; a worker pool is only started if there are subdirectories
+        to_scan = add_children(tree, _scan_directory(str(root_dir), file_rules, dir_rules))
+        if to_scan:
+            with ThreadPoolExecutor(max_workers=SNAPSHOT_SCAN_WORKERS) as executor:
+                # Each pending scan maps to the (node, path) that will receive its children
+                pending = {executor.submit(_scan_directory, path, file_rules, dir_rules): (node, path) for node, path in to_scan}
+                while pending:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        parent_node, current_path_for_error = pending.pop(future)
+                        for node, path in add_children(parent_node, future.result()):
+                            pending[executor.submit(_scan_directory, path, file_rules, dir_rules)] = (node, path)
 
         # --- Generate map string from the completed tree ---
-        map_lines = []
-
-        # Recursive helper function to build the output lines
-        def build_map_lines_from_tree(node, level, prefix_str="", is_last=False):
-            # --- EMOJI LOGIC USING EXPANDED DEFINITIONS ---
-            emoji_prefix = ""
-            if show_emojis:
-                if node['is_dir']:
-                    emoji_prefix = FOLDER_EMOJI + " "
-                else:
-                    file_name = node.get('name', '')
-                    parts = file_name.split('.')
-                    extension = parts[-1].lower() if len(parts) > 1 and parts[-1] else ''
-                    if file_name.lower().endswith(".tar.gz"): extension = "gz"
-                    elif file_name.lower().endswith(".tar.bz2"): extension = "bz2"
-                    file_emoji = FILE_TYPE_EMOJIS.get(extension, DEFAULT_FILE_EMOJI)
-                    emoji_prefix = file_emoji + " "
-            # --- END OF EMOJI LOGIC ---
-
-            indent_str = ""
-            current_prefix = ""
-            item_separator = ""
-
-            # Determine indentation and prefix based on format
-            if output_format == "Tabs":
-                indent_str = "\t" * level
-            elif output_format == "Tree":
-                if level > 0: # Apply tree structure only from level 1 onwards
-                    indent_str = prefix_str
-                    current_prefix = TREE_LAST_BRANCH if is_last else TREE_BRANCH
-                # Level 0 (root) gets no indent_str or current_prefix from tree logic
-            else: # Default: "Standard Indent"
-                indent_str = " " * (level * DEFAULT_SNAPSHOT_SPACES)
-
-            suffix = "/" if node['is_dir'] else ""
-            # Special case: Root node (level 0) name doesn't get the suffix automatically
-            # from os.walk, so add it if it's a directory.
-            if level == 0 and node['is_dir'] and not node['name'].endswith('/'):
-                name_to_display = node['name'] + '/'
-            else:
-                # For children or files, name is usually correct from os.walk or intermediate build
-                name_to_display = node['name'] + suffix
-
-
-            map_lines.append(f"{indent_str}{current_prefix}{item_separator}{emoji_prefix}{name_to_display.strip('/')}{suffix}") # Ensure suffix is added correctly
-
-
-            # Recursively process children if it's a directory with children
-            if node.get('children'):
-                 child_prefix_addition = ""
-                 # Determine prefix addition needed for Tree format children
-                 if output_format == "Tree":
-                      child_prefix_addition = TREE_SPACE if is_last else TREE_PIPE
-                 next_prefix_str = prefix_str + child_prefix_addition
-
-                 sorted_children = sorted(node['children'], key=lambda x: (not x['is_dir'], x['name'].lower()))
-                 num_children = len(sorted_children)
-                 for i, child in enumerate(sorted_children):
-                     child_is_last = (i == num_children - 1)
-                     # Recursive call for each child, increasing level
-                     build_map_lines_from_tree(child, level + 1, next_prefix_str, child_is_last)
-
-        # --- Start the recursive generation process ---
-        # Initiate the process by calling the helper function with the root node (tree) itself.
-        # The root node will be rendered at level 0. Its children will be level 1+.
-        build_map_lines_from_tree(tree, level=0, prefix_str="", is_last=True)
-
-        return "\n".join(map_lines)
+        lines = _iter_snapshot_lines(tree, output_format, show_emojis)
+        if output is None:
+            return "\n".join(lines)
+        # Stream to the caller's file object so the whole map is never held in memory at once
+        output.write(next(lines)) # The root line always exists
+        for line in lines:
+            output.write("\n")
+            output.write(line)
+        return ""
 
     except Exception as e:
         print(f"ERROR: Unhandled exception during directory snapshot near {current_path_for_error}: {e}")
@@ -389,6 +451,30 @@ def create_directory_snapshot(root_dir_str, custom_ignore_patterns=None, user_de
 # ============================================================
 # --- Scaffold Functions ---
 # ============================================================
+# Characters not allowed in file names (on Windows); each is replaced with '_'
+_FILENAME_SANITIZE_TABLE = str.maketrans({c: '_' for c in '<>:"/\\|?*'})
+
+_TOUCH_CREATE_FLAGS = os.O_CREAT | os.O_EXCL | os.O_WRONLY
+
+def _touch(path: str) -> None:
+    """Creates an empty file, or updates its timestamp if it exists (same as Path.touch(exist_ok=True))."""
+    # Scaffolded files are usually new, so try the exclusive create first: open + close for a new file
+    try:
+        os.close(os.open(path, _TOUCH_CREATE_FLAGS, 0o666))
+    except FileExistsError:
+        os.utime(path, None)
+
+def _mkdir_exist_ok(path: str) -> None:
+    """
+    os.makedirs(path, exist_ok=True) for a path whose parent is known to exist: a single mkdir call,
+    without makedirs' existence check on the parent. Raises if the path exists but isn't a directory.
+    """
+    try:
+        os.mkdir(path)
+    except OSError:
+        if not os.path.isdir(path):
+            raise
+
 def create_structure_from_map(map_text: str, base_dir_str: str, format_hint: str = "Auto-Detect",
                               excluded_lines: Optional[Set[int]] = None,
                               queue: Optional[Any] = None) -> Tuple[str, bool, Optional[str]]:
@@ -447,10 +533,14 @@ def create_structure_from_parsed(parsed_items: List[Tuple[int, str, bool]], base
     if not base_dir.is_dir():
         return f"Error: Base directory '{base_dir_str}' is not valid or accessible.", False, None
 
-    path_stack: List[Path] = [base_dir] # Stack holds parent Path objects for current level
+    # Stack holds parent directory paths for current level. Paths are built by plain string concatenation,
+    # so the base is kept without a trailing separator (a filesystem root like '/' becomes '').
+    base_dir_prefix = str(base_dir).rstrip(os.sep)
+    path_stack: List[str] = [base_dir_prefix]
     created_root_name: Optional[str] = None
     total_items = len(parsed_items)
     item_name_for_error = "<No Items Parsed>" # For error reporting
+    progress_step = max(1, total_items // SCAFFOLD_PROGRESS_UPDATES) # Items between progress messages
 
     # --- Handle Empty Input Gracefully ---
     if not parsed_items:
@@ -468,7 +558,7 @@ def create_structure_from_parsed(parsed_items: List[Tuple[int, str, bool]], base
         # --- Process Items ---
         for i, (current_level, item_name, is_directory) in enumerate(parsed_items):
             item_name_for_error = item_name # Update for error context
-            if queue: # Send progress update
+            if queue and (i + 1) % progress_step == 0: # Send progress update (batched)
                 queue.put({'type': 'progress', 'current': i + 1, 'total': total_items})
 
             # --- Manage Path Stack ---
@@ -477,9 +567,8 @@ def create_structure_from_parsed(parsed_items: List[Tuple[int, str, bool]], base
             # Item at level 0 -> parent is stack[0] (base_dir) -> stack len = 1
             # Item at level 1 -> parent is stack[1] (level 0 dir) -> stack len = 2
             target_stack_len = current_level + 1
-            # Pop levels off the stack until we are at the parent level
-            while len(path_stack) > target_stack_len:
-                path_stack.pop()
+            # Pop levels off the stack until we are at the parent level (one slice delete; no-op if already there)
+            del path_stack[target_stack_len:]
 
             # --- Indentation/Structure Consistency Check ---
             if len(path_stack) != target_stack_len:
@@ -496,7 +585,7 @@ def create_structure_from_parsed(parsed_items: List[Tuple[int, str, bool]], base
 
             # --- Sanitize Item Name for Filesystem ---
             # Remove potentially problematic characters
-            safe_item_name = re.sub(r'[<>:"/\\|?*]', '_', item_name)
+            safe_item_name = item_name.translate(_FILENAME_SANITIZE_TABLE)
             # Remove leading/trailing dots and spaces (problematic on Windows)
             safe_item_name = safe_item_name.strip('. ')
             if not safe_item_name:
@@ -504,7 +593,7 @@ def create_structure_from_parsed(parsed_items: List[Tuple[int, str, bool]], base
                  safe_item_name = f"_sanitized_empty_name_{i+1}" # Use 1-based index for user message
                  print(f"Warning: Item '{item_name}' (line approx {i+1}) resulted in empty name after sanitization, using '{safe_item_name}'.")
 
-            current_path = current_parent_path / safe_item_name
+            current_path = current_parent_path + os.sep + safe_item_name # Sanitized names contain no separators
 
             # Store the name of the first created item (the root of the map structure)
             if i == 0:
@@ -512,15 +601,13 @@ def create_structure_from_parsed(parsed_items: List[Tuple[int, str, bool]], base
 
             # --- Create File or Directory ---
             if is_directory:
-                # Create the directory, including any necessary parent directories (idempotent)
-                current_path.mkdir(parents=True, exist_ok=True)
+                # Create the directory (idempotent); its parent is already on the stack, so it exists
+                _mkdir_exist_ok(current_path)
                 # Push this new directory onto the stack for its potential children
                 path_stack.append(current_path)
             else:
-                # Ensure the file's parent directory exists (idempotent)
-                current_path.parent.mkdir(parents=True, exist_ok=True)
-                # Create the empty file (or update timestamp if it exists)
-                current_path.touch(exist_ok=True)
+                # Create the empty file (or update timestamp if it exists); its parent on the stack exists
+                _touch(current_path)
 
     except ValueError as ve:
         # Specific errors raised due to map structure issues
@@ -565,78 +652,87 @@ def parse_map(map_text: str, format_hint: str, excluded_lines: Optional[Set[int]
              actual_format = "Generic" # Fallback to generic if detection fails
 
     # Select the appropriate parsing function based on the determined format
-    parser_func = None
-    if actual_format == "Spaces (2)":
-        parser_func = lambda text, excludes: _parse_indent_based(text, excludes, spaces_per_level=2)
-    elif actual_format == "Spaces (4)":
-        parser_func = lambda text, excludes: _parse_indent_based(text, excludes, spaces_per_level=4)
-    elif actual_format == "Tabs":
-        parser_func = lambda text, excludes: _parse_indent_based(text, excludes, use_tabs=True)
-    elif actual_format == "Tree":
-        parser_func = _parse_tree_format # Uses revised tree logic
-    elif actual_format == "Generic":
-        parser_func = _parse_generic_indent # Fallback using older helper
-    else:
+    parser_func = _PARSERS_BY_FORMAT.get(actual_format)
+    if parser_func is None:
         # Should not happen if auto-detect falls back to Generic or Unknown->Generic
         print(f"Error: Unknown format '{actual_format}' specified. Cannot parse.")
         return None
 
     # Call the selected parser function
-    if parser_func:
-        try:
-            parsed_result = parser_func(map_text, excluded_lines)
-            # Parser functions should return [] if valid but empty, None on error.
-            return parsed_result
-        except Exception as e:
-            print(f"Error: Exception during call to parser for format '{actual_format}': {e}")
-            traceback.print_exc()
-            return None # Indicate failure
-    else:
-        # This case should also not be reachable normally
-        print(f"Error: No parser function could be assigned for format '{actual_format}'.")
-        return None
+    try:
+        parsed_result = parser_func(map_text, excluded_lines)
+        # Parser functions should return [] if valid but empty, None on error.
+        return parsed_result
+    except Exception as e:
+        print(f"Error: Exception during call to parser for format '{actual_format}': {e}")
+        traceback.print_exc()
+        return None # Indicate failure
+
+def _iter_lines(text: str, chunk_chars: int = 4096) -> Iterator[str]:
+    """
+    Yields the same lines as text.splitlines(), but splits the text a chunk at a time,
+    so a caller that stops early never splits (or allocates) the rest of a large text.
+    """
+    start = 0
+    while len(text) - start > chunk_chars:
+        pieces = text[start:start + chunk_chars].splitlines(keepends=True)
+        # The last piece may be cut mid-line (or between '\r' and '\n'): re-read it with the next chunk
+        partial = pieces.pop()
+        if not pieces: # One line fills the whole chunk; retry with a bigger one
+            chunk_chars *= 2
+            continue
+        for piece in pieces:
+            yield piece.splitlines()[0] # Drop the line ending, whichever one it is
+        start += chunk_chars - len(partial)
+    yield from text[start:].splitlines()
 
 def _detect_format(map_text: str, sample_lines: int = 25) -> str:
     """
     Analyzes the first few lines of map_text to detect the format.
     Returns one of: "Tree", "Tabs", "Spaces (4)", "Spaces (2)", "Generic", "Unknown".
     """
-    lines = map_text.strip().splitlines()
-    # Consider only lines with some non-whitespace content for detection
-    non_empty_lines = [line for line in lines if line.strip()][:sample_lines]
+    lines = _iter_lines(map_text.strip()) # Only the sampled start of the map is split into lines
+
+    # Single pass over the first `sample_lines` lines with some non-whitespace content, tallying
+    # what each detector needs. A tree prefix on any sampled line wins, so it returns immediately.
+    sampled = 0
+    has_tab_start = False
+    space_indent_gcd = 0 # gcd of all positive leading-space counts (0 until one is seen)
+    for line in lines:
+        if not line or line.isspace(): # Same test as `not line.strip()`, without building a copy
+            continue
+        # --- Tree Detection ---
+        # Check for explicit tree prefixes (more reliable), after potential leading whitespace
+        if TREE_PREFIX_RE.match(line):
+            return "Tree"
+        # --- Tab / Space Indentation Tally ---
+        if line[0] == '\t':
+            has_tab_start = True
+        elif line[0] == ' ':
+            space_indent_gcd = gcd(space_indent_gcd, len(line) - len(line.lstrip(' ')))
+        sampled += 1
+        if sampled == sample_lines:
+            break
 
-    if not non_empty_lines:
+    if not sampled:
         return "Generic" # Treat empty or whitespace-only input as Generic
 
-    # --- Tree Detection ---
-    # Check for explicit tree prefixes (more reliable)
-    # Need to check after potential leading whitespace
-    has_tree_prefix = any(TREE_PREFIX_RE.match(line) for line in non_empty_lines)
-    if has_tree_prefix:
-        return "Tree"
-    # Fallback: Check for structure characters anywhere might be too broad, stick to prefixes.
-
     # --- Tab Detection ---
-    # Check if any non-empty, non-whitespace line *starts* with a tab
-    if any(line.startswith('\t') for line in non_empty_lines if line and not line.isspace()):
+    # Any sampled line *starting* with a tab
+    if has_tab_start:
         return "Tabs"
 
     # --- Space Indentation Detection ---
-    # Collect leading space counts from lines that are indented with spaces
-    space_indented_lines = [line for line in non_empty_lines if line and not line.isspace() and line[0] == ' ']
-    leading_spaces = [len(line) - len(line.lstrip(' ')) for line in space_indented_lines]
-    # Get unique positive indentation values found
-    space_indents = sorted(list(set(sp for sp in leading_spaces if sp > 0)))
-
-    if not space_indents:
+    if not space_indent_gcd:
         # No space-indented lines found among non-empty lines (could be all level 0, or tabs/tree missed)
         # If no tabs/tree detected either, fall back to Generic
         return "Generic"
 
-    # Check for consistency based on common indent levels (4 or 2)
-    if all(s % 4 == 0 for s in space_indents):
+    # Check for consistency based on common indent levels (4 or 2):
+    # every indent is a multiple of n exactly when their gcd is
+    if space_indent_gcd % 4 == 0:
         return "Spaces (4)"
-    if all(s % 2 == 0 for s in space_indents):
+    if space_indent_gcd % 2 == 0:
         # This catches multiples of 2, including 4. Check 4 first.
         return "Spaces (2)"
 
@@ -644,6 +740,12 @@ def _detect_format(map_text: str, sample_lines: int = 25) -> str:
     return "Generic"
 
 # --- Specific Parser Implementations ---
+def _numbered_lines(lines: List[str], excluded_lines: Set[int]) -> Iterable[Tuple[int, str]]:
+    """ Yields (line_num, line) pairs (1-based), skipping excluded line numbers. """
+    if not excluded_lines: # Common case: nothing excluded, so skip the per-line membership test
+        return enumerate(lines, start=1)
+    return ((line_num, line) for line_num, line in enumerate(lines, start=1) if line_num not in excluded_lines)
+
 def _parse_indent_based(map_text: str, excluded_lines: Set[int],
                         spaces_per_level: Optional[int] = None, use_tabs: bool = False) -> Optional[List[Tuple[int, str, bool]]]:
     """ Parses map text using consistent space or tab indentation. """
@@ -660,19 +762,18 @@ def _parse_indent_based(map_text: str, excluded_lines: Set[int],
 
     expected_level = 0 # Track expected level to detect inconsistencies
 
-    for line_num, line in enumerate(lines, start=1):
-        if line_num in excluded_lines:
-            continue # Skip excluded lines
+    for line_num, line in _numbered_lines(lines, excluded_lines): # Excluded lines are skipped
 
-        components = _extract_line_components(line) # Uses OLD helper, updated for emojis
-        if components.is_empty_or_comment:
+        # Unpack once; only the indent, name and type are needed here
+        raw_indent_width, _, _, _, item_name, is_directory, is_empty_or_comment = _extract_line_components(line)
+        if is_empty_or_comment:
             continue # Skip empty lines and comments
 
         # Determine leading characters count based on mode (tabs or spaces)
         if use_tabs:
             leading_chars_count = len(line) - len(line.lstrip('\t'))
         else:
-            leading_chars_count = components.raw_indent_width # Use space count
+            leading_chars_count = raw_indent_width # Use space count
 
         current_level = -1
         # Check for exact divisibility by the indent unit
@@ -695,8 +796,6 @@ def _parse_indent_based(map_text: str, excluded_lines: Set[int],
         # --- End optional check ---
 
 
-        item_name = components.clean_name
-        is_directory = components.is_directory
         if not item_name:
              print(f"Warning (_parse_indent_based): Skipping line {line_num} as no item name found after parsing. Line: '{line.rstrip()}'")
              continue # Skip if parsing failed to find a name
@@ -716,44 +815,21 @@ def _parse_tree_format(map_text: str, excluded_lines: Set[int]) -> Optional[List
     parsed_items: List[Tuple[int, str, bool]] = []
     expected_level = 0 # Track expected level
 
-    for line_num, line in enumerate(lines, start=1):
+    for line_num, line in _numbered_lines(lines, excluded_lines):
         original_line_rstrip = line.rstrip()
-        if line_num in excluded_lines:
-            continue
         # Skip empty lines and comments
         line_content = original_line_rstrip.strip()
         if not line_content or line_content.startswith('#'):
             continue
 
-        current_level = 0
-        name_remainder_index = 0 # Index in original_line_rstrip where content starts
-
-        # --- Calculate Level based on Pipe/Space prefixes ---
-        while True:
-            segment = original_line_rstrip[name_remainder_index : name_remainder_index + TREE_LEVEL_UNIT_LEN]
-            if segment == TREE_PIPE:
-                current_level += 1
-                name_remainder_index += TREE_LEVEL_UNIT_LEN
-            elif segment == TREE_SPACE: # Also indicates a level, just under a 'last branch' parent
-                current_level += 1
-                name_remainder_index += TREE_LEVEL_UNIT_LEN
-            else:
-                # Stop when we don't see a standard pipe/space segment
-                break
-
-        # --- Identify Branch Prefix ---
-        remainder_after_level = original_line_rstrip[name_remainder_index:]
-        has_branch_prefix = False
-        if remainder_after_level.startswith(TREE_BRANCH):
-            name_remainder_index += len(TREE_BRANCH)
-            has_branch_prefix = True
-        elif remainder_after_level.startswith(TREE_LAST_BRANCH):
-            name_remainder_index += len(TREE_LAST_BRANCH)
-            has_branch_prefix = True
-        # Allow lines without a branch prefix only if they are at level 0
-        elif current_level == 0:
-             pass # Level 0 items might not have a branch prefix
-        else:
+        # --- Calculate Level and Identify Branch Prefix in one regex match ---
+        # Each TREE_PIPE/TREE_SPACE unit is one level (TREE_SPACE sits under a 'last branch' parent)
+        prefix_match = _TREE_LINE_PREFIX_RE.match(original_line_rstrip)
+        current_level = prefix_match.end(1) // TREE_LEVEL_UNIT_LEN
+        name_remainder_index = prefix_match.end() # Index in original_line_rstrip where content starts
+        has_branch_prefix = prefix_match.group(2) is not None
+        # Allow lines without a branch prefix only if they are at level 0 (level 0 items might not have one)
+        if not has_branch_prefix and current_level != 0:
              # If not level 0 and no branch prefix found, it's likely a format error
              print(f"Warning (_parse_tree_format): Skipping line {line_num} due to missing tree branch prefix "
                    f"at level {current_level}. Line: '{original_line_rstrip}'")
@@ -804,16 +880,13 @@ def _parse_generic_indent(map_text: str, excluded_lines: Set[int]) -> Optional[L
 
     last_processed_level = -1 # Track the level of the previously added item
 
-    for line_num, line in enumerate(lines, start=1):
-        if line_num in excluded_lines:
-            continue
-
-        components = _extract_line_components(line) # Uses OLD helper, updated for emojis
-        if components.is_empty_or_comment:
+    for line_num, line in _numbered_lines(lines, excluded_lines):
+        # Unpack once; only the indent, name and type are needed here
+        indent_width, _, _, _, item_name, is_directory, is_empty_or_comment = _extract_line_components(line)
+        if is_empty_or_comment:
             continue
 
         # Use raw_indent_width (leading spaces) as the key for level determination
-        indent_width = components.raw_indent_width
         current_level = -1
 
         # Determine level based on indent width changes
@@ -825,9 +898,9 @@ def _parse_generic_indent(map_text: str, excluded_lines: Set[int]) -> Optional[L
         elif indent_width in indent_map:
             # Seen this indent before, find its level
             current_level = indent_map[indent_width]
-            # Pop stack back to the parent level of this indent
-            while level_stack[-1] > indent_width:
-                 level_stack.pop()
+            # Pop stack back to the parent level of this indent. The stack only ever grows with
+            # larger widths, so it is sorted and everything deeper can be cut off in one slice.
+            del level_stack[bisect_right(level_stack, indent_width):]
             # Safety check: Ensure the indent found matches the top of the stack after popping
             if level_stack[-1] != indent_width:
                  print(f"Warning (_parse_generic_indent): Indentation logic inconsistency on line {line_num}. "
@@ -856,8 +929,6 @@ def _parse_generic_indent(map_text: str, excluded_lines: Set[int]) -> Optional[L
                   continue
 
 
-        item_name = components.clean_name
-        is_directory = components.is_directory
         if not item_name:
             print(f"Warning (_parse_generic_indent): Skipping line {line_num} as no item name found after parsing. Line: '{line.rstrip()}'")
             continue
@@ -869,4 +940,14 @@ def _parse_generic_indent(map_text: str, excluded_lines: Set[int]) -> Optional[L
     if parsed_items and parsed_items[0][0] != 0:
         print(f"Warning (_parse_generic_indent): First parsed item '{parsed_items[0][1]}' is at level {parsed_items[0][0]} (expected 0). Structure might be incorrect.")
 
-    return parsed_items
\ No newline at end of file
+    return parsed_items
+
+# Parser for each concrete map format; built once instead of per parse_map call.
+# Every parser takes (map_text, excluded_lines).
+_PARSERS_BY_FORMAT: Dict[str, Callable[[str, Set[int]], Optional[List[Tuple[int, str, bool]]]]] = {
+    "Spaces (2)": partial(_parse_indent_based, spaces_per_level=2),
+    "Spaces (4)": partial(_parse_indent_based, spaces_per_level=4),
+    "Tabs": partial(_parse_indent_based, use_tabs=True),
+    "Tree": _parse_tree_format, # Uses revised tree logic
+    "Generic": _parse_generic_indent, # Fallback using older helper
+}
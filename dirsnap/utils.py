@@ -2,6 +2,7 @@
 """ utils.py: Contains helper functions or constants that might be shared across modules. """
 import sys
 import os
+from functools import lru_cache
 from pathlib import Path
 
 # --- Constants ---
@@ -12,9 +13,11 @@ CONFIG_FILENAME = "config.json"
 
 # --- Configuration File Helper ---
 
+@lru_cache(maxsize=1)
 def get_config_dir() -> Path:
     """
     Determines the platform-specific user configuration directory for the application.
+    Computed once per process (the environment it depends on doesn't change while running).
 
     Returns:
         Path: The path to the configuration directory.
@@ -64,4 +67,4 @@ def get_config_path() -> Path:
             # For now, we'll just return the path and let file operations fail later
             pass # Allow returning the path even if creation failed
 
-    return config_dir / CONFIG_FILENAME
\ No newline at end of file
+    return config_dir / CONFIG_FILENAME